@@ -1,8 +1,150 @@
 import re
+import faiss
 import numpy as np
-from typing import List, Dict, Tuple
+from numba import njit, prange
+from typing import List, Dict, Iterator, Tuple
 from tqdm import tqdm
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.vectors import normalize_embeddings
+
+
+def exact_range_search(
+    embeddings: np.ndarray,
+    threshold: float,
+    block_size: int = 512,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Finds all pairs with inner product >= threshold using an exact FAISS index.
+
+    Queries are run in blocks of block_size rows, so only one block of results is held
+    in memory at a time. Yields (start, lims, sims, neighbors) per block in FAISS
+    range-search layout: the neighbors of row start + i are neighbors[lims[i]:lims[i+1]]
+    with similarities sims[lims[i]:lims[i+1]].
+    """
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    # FAISS keeps only sims > radius; search just below the threshold and filter
+    # with >= so pairs exactly at the threshold are included (as in lsh_range_search)
+    radius = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+    for start in range(0, len(embeddings), block_size):
+        lims, sims, neighbors = index.range_search(embeddings[start:start + block_size], radius)
+        keep = sims >= np.float32(threshold)
+        kept_before = np.concatenate(([0], np.cumsum(keep, dtype=np.int64)))
+        yield start, kept_before[lims.astype(np.int64)], sims[keep], neighbors[keep]
+
+
+def lsh_range_search(
+    embeddings: np.ndarray,
+    threshold: float,
+    n_tables: int = 8,
+    bits_per_table: int = 16,
+    seed: int = 42,
+    block_size: int = 512,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Approximate alternative to exact_range_search using SimHash (random-projection LSH).
+
+    Each vector is hashed to n_tables signatures of bits_per_table sign bits. Only vectors
+    sharing a signature in at least one table are compared, with exact cosine similarity
+    inside each bucket. Near-duplicates can be missed when they never share a bucket, so
+    this trades some recall for speed on large datasets. Large buckets are compared in
+    blocks of block_size rows, so memory stays bounded even when many vectors collide.
+
+    Only pairs (i, j) with i < j are returned, as a single block in the same layout as
+    exact_range_search.
+    """
+    n, d = embeddings.shape
+    rng = np.random.default_rng(seed)
+    projections = rng.standard_normal((d, n_tables * bits_per_table)).astype(np.float32)
+
+    # Pack the sign bits of each table into a single integer key per vector and table
+    bits = (embeddings @ projections > 0).reshape(n, n_tables, bits_per_table)
+    keys = bits.astype(np.int64) @ (1 << np.arange(bits_per_table, dtype=np.int64))
+
+    rows, cols, sims = [], [], []
+    for t in range(n_tables):
+        order = np.argsort(keys[:, t], kind="stable")
+        sorted_keys = keys[order, t]
+        bucket_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1], True])
+        for start, end in zip(bucket_starts[:-1], bucket_starts[1:]):
+            if end - start < 2:
+                continue
+            members = np.sort(order[start:end])
+            # Compare each row block only against itself and later members (upper triangle)
+            for r0 in range(0, len(members), block_size):
+                block_rows = members[r0:r0 + block_size]
+                block_cols = members[r0:]
+                block = embeddings[block_rows] @ embeddings[block_cols].T
+                ii, jj = np.nonzero(block >= threshold)
+                upper = jj > ii
+                ii, jj = ii[upper], jj[upper]
+                rows.append(block_rows[ii])
+                cols.append(block_cols[jj])
+                sims.append(block[ii, jj])
+
+    if not rows:
+        yield 0, np.zeros(n + 1, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        return
+
+    # The same pair can collide in several tables; keep one copy, ordered by row
+    rows, cols, sims = np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+    _, unique_idx = np.unique(rows * n + cols, return_index=True)
+    rows, cols, sims = rows[unique_idx], cols[unique_idx], sims[unique_idx]
+    lims = np.searchsorted(rows, np.arange(n + 1))
+    yield 0, lims, sims, cols
+
+
+@njit(parallel=True, cache=True)
+def upper_triangle_pairs(lims: np.ndarray, neighbors: np.ndarray, start: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selects the candidate pairs (i, j) with j > i from one block of range-search results.
+
+    Rows are independent, so they are processed in parallel: one pass counts each row's
+    pairs, a prefix sum gives each row its output offset, and a second pass fills them in.
+    Returns (rows, positions), ordered by row, where positions index into neighbors/sims.
+    """
+    n_rows = lims.shape[0] - 1
+    counts = np.zeros(n_rows, dtype=np.int64)
+    for r in prange(n_rows):
+        i = start + r
+        count = 0
+        for p in range(lims[r], lims[r + 1]):
+            if neighbors[p] > i:
+                count += 1
+        counts[r] = count
+
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    rows = np.empty(offsets[-1], dtype=np.int64)
+    positions = np.empty(offsets[-1], dtype=np.int64)
+    for r in prange(n_rows):
+        i = start + r
+        k = offsets[r]
+        for p in range(lims[r], lims[r + 1]):
+            if neighbors[p] > i:
+                rows[k] = i
+                positions[k] = p
+                k += 1
+    return rows, positions
+
+
+@njit(cache=True)
+def mark_duplicates(rows: np.ndarray, cols: np.ndarray, remove: np.ndarray) -> np.ndarray:
+    """
+    Applies the keep-first-occurrence rule to candidate pairs (rows[k], cols[k]) ordered by row.
+
+    For every row i that is still kept, each partner j is marked for removal in the boolean
+    mask `remove` (updated in place, so it carries over between blocks processed in order).
+    Returns a boolean mask over the pairs flagging the ones that caused a removal.
+    """
+    is_pair = np.zeros(rows.shape[0], dtype=np.bool_)
+    for k in range(rows.shape[0]):
+        i = rows[k]
+        j = cols[k]
+        if not remove[i] and not remove[j]:
+            remove[j] = True  # Keep first occurrence, remove subsequent
+            is_pair[k] = True
+    return is_pair
+
 
 def filter_synthetic_questions(
     synthetic_data: List[Dict],
@@ -10,6 +152,8 @@ def filter_synthetic_questions(
     max_question_length: int = 50,
     similarity_threshold: float = 0.95,
     remove_duplicates: bool = True,
+    use_lsh: bool = False,
+    embeddings: np.ndarray = None,
 ) -> Tuple[List[Dict], List[Dict]]:
     """
     Filters a dataset of synthetic questions based on length and duplicate detection.
@@ -25,17 +169,28 @@ def filter_synthetic_questions(
       - max_question_length: Maximum allowed question length (in words).
       - similarity_threshold: Cosine similarity threshold for duplicate detection (default 0.95).
       - remove_duplicates: Whether to check for duplicates using embeddings (default True).
+      - use_lsh: Use an approximate LSH pre-filter instead of exact search for duplicate
+        candidates (default False). Faster for large datasets, but may miss some duplicates.
+      - embeddings: Optional (N, d) matrix where row i is the embedding of synthetic_data[i].
+        When given, it is used instead of the per-item "synthetic_question_embedding" lists.
 
     Returns:
       A tuple with:
          (accepted_data, filtered_out_data)
     """
+    if embeddings is not None and len(embeddings) != len(synthetic_data):
+        raise ValueError(
+            f"embeddings must have one row per item in synthetic_data: "
+            f"got {len(embeddings)} rows for {len(synthetic_data)} items"
+        )
+
     accepted_data = []
+    accepted_rows = []
     filtered_out_data = []
 
     # First pass: Filter by length
     print("Filtering by length...")
-    for item in tqdm(synthetic_data, desc="Length filter"):
+    for row, item in enumerate(tqdm(synthetic_data, desc="Length filter")):
         # Retrieve and clean the synthetic question.
         q = item.get("synthetic_question", "").strip()
         
@@ -58,43 +213,58 @@ def filter_synthetic_questions(
             continue
 
         accepted_data.append(item)
+        accepted_rows.append(row)
 
     # Second pass: Check for duplicates using cosine similarity
     if remove_duplicates and len(accepted_data) > 0:
         # Check if embeddings are available
-        has_embeddings = "synthetic_question_embedding" in accepted_data[0]
+        has_embeddings = embeddings is not None or "synthetic_question_embedding" in accepted_data[0]
         
         if has_embeddings:
             print("\nChecking for duplicates using embeddings...")
             
-            # Extract embeddings
-            embeddings = np.vstack([np.array(item["synthetic_question_embedding"]) for item in accepted_data])
-            
-            # Compute pairwise similarity
-            similarity_matrix = cosine_similarity(embeddings)
+            # Extract embeddings as a contiguous float32 matrix and L2-normalize them,
+            # so that inner product equals cosine similarity
+            if embeddings is not None:
+                accepted_embeddings = normalize_embeddings(np.asarray(embeddings)[accepted_rows])
+            else:
+                accepted_embeddings = normalize_embeddings(
+                    [item["synthetic_question_embedding"] for item in accepted_data]
+                )
             
-            # Track indices to remove
-            indices_to_remove = set()
+            # Range search returns only the pairs above the threshold, block by block,
+            # so the full N x N similarity matrix is never materialized
+            range_search = lsh_range_search if use_lsh else exact_range_search
+            remove = np.zeros(len(accepted_data), dtype=bool)
             duplicate_pairs = []
             
-            for i in range(len(similarity_matrix)):
-                if i in indices_to_remove:
-                    continue
-                for j in range(i+1, len(similarity_matrix)):
-                    if j in indices_to_remove:
-                        continue
-                    if similarity_matrix[i][j] >= similarity_threshold:
-                        duplicate_pairs.append((i, j, similarity_matrix[i][j]))
-                        indices_to_remove.add(j)  # Keep first occurrence, remove subsequent
+            for start, lims, sims, neighbors in range_search(accepted_embeddings, similarity_threshold):
+                # Extract candidate pairs in parallel, then mark duplicates to remove
+                # in a sequential compiled pass (keep-first depends on row order)
+                rows, positions = upper_triangle_pairs(lims, neighbors, start)
+                cols = neighbors[positions]
+                is_pair = mark_duplicates(rows, cols, remove)
+                
+                # Collect the (i, j, similarity) duplicate pairs, ordered by (i, j)
+                pair_rows, pair_cols = rows[is_pair], cols[is_pair]
+                pair_sims = sims[positions[is_pair]]
+                order = np.lexsort((pair_cols, pair_rows))
+                duplicate_pairs.extend(
+                    (int(i), int(j), float(sim))
+                    for i, j, sim in zip(pair_rows[order], pair_cols[order], pair_sims[order])
+                )
             
             # Report findings
             if duplicate_pairs:
                 print(f"\n🔍 Found {len(duplicate_pairs)} duplicate pairs (similarity >= {similarity_threshold})")
-                print(f"   Removing {len(indices_to_remove)} duplicate questions...")
+                print(f"   Removing {int(remove.sum())} duplicate questions...")
                 
                 # Show some examples
-                exact_duplicates = [p for p in duplicate_pairs if p[2] == 1.0]
-                near_duplicates = [p for p in duplicate_pairs if similarity_threshold <= p[2] < 1.0]
+                # float32 inner products of identical vectors can land just below 1.0,
+                # so allow a small absolute (float32 rounding scale) tolerance only
+                is_exact = np.isclose([p[2] for p in duplicate_pairs], 1.0, rtol=0, atol=1e-6)
+                exact_duplicates = [p for p, exact in zip(duplicate_pairs, is_exact) if exact]
+                near_duplicates = [p for p, exact in zip(duplicate_pairs, is_exact) if not exact]
                 
                 if exact_duplicates:
                     print(f"   • Exact duplicates (similarity = 1.0): {len(exact_duplicates)}")
@@ -104,16 +274,13 @@ def filter_synthetic_questions(
                 if near_duplicates:
                     print(f"   • Near-duplicates ({similarity_threshold} ≤ similarity < 1.0): {len(near_duplicates)}")
                 
-                # Move duplicates to filtered_out_data
-                final_accepted = []
-                for idx, item in enumerate(accepted_data):
-                    if idx in indices_to_remove:
-                        item["filtered_reason"] = f"Duplicate (similarity >= {similarity_threshold})"
-                        filtered_out_data.append(item)
-                    else:
-                        final_accepted.append(item)
+                # Move duplicates to filtered_out_data, selecting rows straight from the mask
+                for idx in np.flatnonzero(remove):
+                    item = accepted_data[idx]
+                    item["filtered_reason"] = f"Duplicate (similarity >= {similarity_threshold})"
+                    filtered_out_data.append(item)
                 
-                accepted_data = final_accepted
+                accepted_data = [accepted_data[idx] for idx in np.flatnonzero(~remove)]
             else:
                 print(f"✅ No duplicates found (threshold: {similarity_threshold})")
         else:
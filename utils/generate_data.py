@@ -1,12 +1,15 @@
+import asyncio
+import json
+from contextlib import AsyncExitStack
 from typing import List
 from typing_extensions import Annotated
 import uuid
 
 import dotenv
 from pydantic import BaseModel, Field
-from utils.llm import get_aoai_client
+from utils.llm import get_async_aoai_client
+from utils.search import find_all_similar_chunks
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from utils.sdg_utils import (
     get_instruction,
@@ -37,6 +40,18 @@ class QuestionSchema(BaseModel):
     ]
 
 
+# Structured-output format derived once from QuestionSchema. The server enforces the schema,
+# so responses are decoded with json.loads instead of being validated into a pydantic model.
+QUESTION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "QuestionSchema",
+        "strict": True,
+        "schema": {**QuestionSchema.model_json_schema(), "additionalProperties": False},
+    },
+}
+
+
 class SyntheticDataGenerator:
     def __init__(self, model):
         self.model = model
@@ -85,7 +100,7 @@ class SyntheticDataGenerator:
         """Select the appropriate system message based on whether the question should be grounded."""
         return self.system_message_grounded if is_grounded else self.system_message_not_grounded
 
-    def invoke_llm(
+    async def invoke_llm(
         self,
         main_chunk: str,
         similar_chunks: list,
@@ -97,9 +112,13 @@ class SyntheticDataGenerator:
         instructions: str,
         question_length: int,
         task: str,
+        client=None,
     ) -> dict:
-        """Invokes the LLM using the provided parameters and returns the parsed response."""
-        client = get_aoai_client()
+        """Invokes the LLM using the provided parameters and returns the parsed response.
+
+        Pass a shared AsyncAzureOpenAI client to reuse its connection pool; without one,
+        a short-lived client is created and closed for this call.
+        """
         user_prompt = self.build_user_prompt(
             main_chunk, similar_chunks, is_grounded, domain, difficulty, topic,
             language, instructions, question_length, task
@@ -109,16 +128,19 @@ class SyntheticDataGenerator:
         system_message = self.get_system_message(is_grounded)
 
         try:
-            response = client.beta.chat.completions.parse(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_prompt},
-                ],
-                # temperature=0.7,
-                max_completion_tokens=5000,
-                response_format=QuestionSchema
-            )
+            async with AsyncExitStack() as stack:
+                if client is None:
+                    client = await stack.enter_async_context(get_async_aoai_client())
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    # temperature=0.7,
+                    max_completion_tokens=5000,
+                    response_format=QUESTION_RESPONSE_FORMAT
+                )
         except Exception as e:
             print("Error during LLM invocation: %s", e)
             raise
@@ -126,14 +148,13 @@ class SyntheticDataGenerator:
         try:
             if not response.choices:
                 raise ValueError("No choices returned from the LLM.")
-            parsed = response.choices[0].message.parsed
-            result = parsed.model_dump()
+            result = json.loads(response.choices[0].message.content)
             return result
         except Exception as e:
             print("Error parsing LLM response: %s", e)
             raise
 
-    def __call__(
+    async def __call__(
         self,
         main_chunk: str,
         similar_chunks: list,
@@ -145,9 +166,10 @@ class SyntheticDataGenerator:
         instructions: str,
         question_length: int,
         task: str,
+        client=None,
     ) -> dict:
         """Makes the class instance callable. Delegates to invoke_llm."""
-        return self.invoke_llm(
+        return await self.invoke_llm(
             main_chunk=main_chunk,
             similar_chunks=similar_chunks,
             is_grounded=is_grounded,
@@ -158,13 +180,12 @@ class SyntheticDataGenerator:
             instructions=instructions,
             question_length=question_length,
             task=task,
+            client=client,
         )
 
 
-def generate_single_question(chunk, generator, task_path, all_chunks):
-    """Helper function to generate a single question (for parallel execution)"""
-    from utils.search import find_similar_chunks
-    
+async def generate_single_question(chunk, generator, task_path, similar_chunk_objs, client=None):
+    """Helper function to generate a single question (for concurrent execution)"""
     main_chunk = chunk["chunk"]
     domain = get_domain()
     tone = get_tone()
@@ -176,15 +197,14 @@ def generate_single_question(chunk, generator, task_path, all_chunks):
     task = get_instruction(task_path)
     is_grounded = set_is_grounded()
 
-    # Find k=5 most similar chunks using k-NN
-    similar_chunk_objs = find_similar_chunks(chunk, all_chunks, k=5)
     similar_chunks = [c["chunk"] for c in similar_chunk_objs]
     
     try:
-        result = generator(
+        result = await generator(
             main_chunk, similar_chunks, is_grounded, domain,
             difficulty, topic, language,
-            instructions, question_length, task
+            instructions, question_length, task,
+            client=client
         )
         question = result["question"][0]
         explanation = result["explanation"][0]
@@ -228,31 +248,34 @@ def generate_single_question(chunk, generator, task_path, all_chunks):
         }
 
 
-def generate_synthetic_questions(chunks, generator, max_workers=10):
-    """Generate synthetic questions in parallel using k-NN for similar chunks."""
+async def generate_synthetic_questions(chunks, embeddings, generator, max_concurrency=50):
+    """Generate synthetic questions concurrently using k-NN for similar chunks (row i of embeddings belongs to chunks[i])."""
     all_results = []
     failed_results = []
     task_path = "configs/settings/task_single_grounded_not_grounded_questions.txt"
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        for chunk in chunks:
-            future = executor.submit(
-                generate_single_question, 
-                chunk, 
-                generator, 
-                task_path,
-                chunks  # Pass all chunks for k-NN search
-            )
-            futures.append(future)
+    # Find k=5 most similar chunks for every chunk using batched k-NN
+    all_similar_chunks = find_all_similar_chunks(chunks, embeddings, k=5)
+    
+    # Limit the number of in-flight LLM requests
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    # One client (and connection pool) per run, bound to the current event loop
+    # and closed when all tasks are done
+    async with get_async_aoai_client() as client:
+        async def generate(chunk, similar_chunk_objs):
+            async with semaphore:
+                return await generate_single_question(chunk, generator, task_path, similar_chunk_objs, client)
         
-        # Calculate total tasks for progress bar
-        total_tasks = len(futures)
+        tasks = [
+            asyncio.ensure_future(generate(chunk, similar_chunk_objs))
+            for chunk, similar_chunk_objs in zip(chunks, all_similar_chunks)
+        ]
         
         # Wait for all tasks to complete and collect results
-        with tqdm(total=total_tasks, desc="Generating synthetic questions") as pbar:
-            for future in as_completed(futures):
-                result = future.result()
+        with tqdm(total=len(tasks), desc="Generating synthetic questions") as pbar:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
                 if result["success"]:
                     all_results.append(result["data"])
                 else:
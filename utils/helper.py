@@ -44,4 +44,6 @@ def load_and_display_settings():
     print("💡 Higher weights = more likely to be selected during generation")
     print("=" * 70)
 
-load_and_display_settings()
\ No newline at end of file
+
+if __name__ == "__main__":
+    load_and_display_settings()
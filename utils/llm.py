@@ -1,17 +1,25 @@
 import os
+import hashlib
+import sqlite3
 import dotenv
+import numpy as np
+from functools import lru_cache
 from typing import List
 
-from openai import AzureOpenAI, AsyncOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI, AsyncOpenAI
 from agents import set_default_openai_client, set_tracing_disabled
 
 # Load environment variables from the specifaied file
 dotenv.load_dotenv(".env")
 
+# On-disk cache of embeddings, keyed by content hash and embedding model
+EMBEDDING_CACHE_PATH = ".embedding_cache.sqlite"
+
 def set_openai_config():
     set_default_openai_client(get_oai_client())
     set_tracing_disabled(True)
 
+@lru_cache(maxsize=1)
 def get_oai_client():
     api_key = os.getenv("AOAI_KEY")
     endpoint = os.getenv("AOAI_ENDPOINT")
@@ -30,6 +38,9 @@ def get_oai_client():
     except Exception as e:
         raise Exception(f"Failed to create OpenAI client: {str(e)}")
 
+# The client wraps a thread-safe, pooled httpx client, so a single shared
+# instance is reused across calls and worker threads.
+@lru_cache(maxsize=1)
 def get_aoai_client():
     try:
         client = AzureOpenAI(
@@ -42,12 +53,81 @@ def get_aoai_client():
         print("Missing required model_config key: %s", e)
         raise
 
-def embed_text(text: str) -> List[float]:
-    response = get_aoai_client().embeddings.create(
-        input=text,
-        model=os.getenv("embeddingModel")
+# Async counterpart of get_aoai_client. Not cached: the client's connection pool is
+# bound to the event loop it is first used on, so create one per run and close it
+# with `async with` (e.g. one client shared by all tasks of an asyncio.run call).
+def get_async_aoai_client():
+    try:
+        client = AsyncAzureOpenAI(
+            azure_endpoint=os.getenv("AOAI_ENDPOINT"),
+            api_key=os.getenv("FOUNDRY_KEY"),
+            api_version=os.getenv("AOAI_API_VERSION")
+        )
+        return client
+    except KeyError as e:
+        print("Missing required model_config key: %s", e)
+        raise
+
+def get_embedding_cache(path: str = EMBEDDING_CACHE_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        "hash TEXT NOT NULL, model TEXT NOT NULL, vec BLOB NOT NULL, "
+        "PRIMARY KEY (hash, model))"
     )
-    return response.data[0].embedding
+    return conn
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def embed_texts(texts: List[str], batch_size: int = 256, use_cache: bool = True) -> List[List[float]]:
+    model = os.getenv("embeddingModel")
+    keys = [content_hash(text) for text in texts]
+    vectors = {}
+
+    conn = get_embedding_cache() if use_cache else None
+    try:
+        # Look up previously embedded texts (chunked to stay below SQLite's variable limit)
+        if conn is not None:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):
+                batch_keys = unique_keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch_keys))})",
+                    [model, *batch_keys]
+                )
+                for key, vec in rows:
+                    vectors[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+
+        # Embed the misses, one request per batch of inputs instead of one request per text
+        misses = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        miss_keys, miss_texts = list(misses), list(misses.values())
+        client = get_aoai_client()
+        for start in range(0, len(miss_texts), batch_size):
+            response = client.embeddings.create(
+                input=miss_texts[start:start + batch_size],
+                model=model
+            )
+            batch_keys = miss_keys[start:start + batch_size]
+            batch_vectors = [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+            vectors.update(zip(batch_keys, batch_vectors))
+
+            if conn is not None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (hash, model, vec) VALUES (?, ?, ?)",
+                    [(key, model, np.asarray(vec, dtype=np.float32).tobytes())
+                     for key, vec in zip(batch_keys, batch_vectors)]
+                )
+                conn.commit()
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return [vectors[key] for key in keys]
+
+def embed_text(text: str, use_cache: bool = True) -> List[float]:
+    return embed_texts([text], use_cache=use_cache)[0]
 
 def invoke_llm(system: str, user: str, model: str) -> str:
     response = get_aoai_client().chat.completions.create(
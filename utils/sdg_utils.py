@@ -1,6 +1,8 @@
 import json
 import os
 import random
+from functools import lru_cache
+from itertools import accumulate
 import numpy as np
 
 
@@ -55,14 +57,22 @@ _cached_options = {}
 def get_cached_options(filename):
     """
     Loads and caches options from a given filename in the configs/settings folder.
+
+    Returns a tuple (options, cum_weights), where cum_weights are the precomputed
+    cumulative weights (or None if all weights are default), so random.choices
+    doesn't have to accumulate the weights on every draw.
     """
     if filename not in _cached_options:
-        _cached_options[filename] = load_options_from_jsonl(filename)
+        options, weights = load_options_from_jsonl(filename)
+        cum_weights = list(accumulate(weights)) if weights else None
+        _cached_options[filename] = (options, cum_weights)
     return _cached_options[filename]
 
+@lru_cache(maxsize=None)
 def get_instruction(path):
     """
     Reads the content of a file (such as your system message or task instructions).
+    The content is cached per path, so repeated calls don't hit the disk again.
     """
     with open(path, "r", encoding="utf-8") as file:
         text = file.read()
@@ -70,18 +80,18 @@ def get_instruction(path):
 
 def get_domain():
     # Uniformly sample a domain from the list of domains.
-    options, weights = get_cached_options("domains.jsonl")
-    return random.choices(options, weights=weights, k=1)[0] if weights else random.choice(options)
+    options, cum_weights = get_cached_options("domains.jsonl")
+    return random.choices(options, cum_weights=cum_weights, k=1)[0] if cum_weights else random.choice(options)
 
 def get_tone():
     # Uniformly sample a tone from the list of tones.
-    options, weights = get_cached_options("tones.jsonl")
-    return random.choices(options, weights=weights, k=1)[0] if weights else random.choice(options)
+    options, cum_weights = get_cached_options("tones.jsonl")
+    return random.choices(options, cum_weights=cum_weights, k=1)[0] if cum_weights else random.choice(options)
 
 def get_length_category():
     # Sample a length category from the list of length categories.
-    options, weights = get_cached_options("length_categories.jsonl")
-    return random.choices(options, weights=weights, k=1)[0] if weights else random.choice(options)
+    options, cum_weights = get_cached_options("length_categories.jsonl")
+    return random.choices(options, cum_weights=cum_weights, k=1)[0] if cum_weights else random.choice(options)
 
 def get_question_length(mu=2.4, sigma=0.42, min_length=4):
     # Sample a question length from a log-normal distribution.
@@ -90,18 +100,18 @@ def get_question_length(mu=2.4, sigma=0.42, min_length=4):
 
 def get_difficulty():
     # Weighted sample a difficulty from the list of difficulties.
-    options, weights = get_cached_options("difficulties.jsonl")
-    return random.choices(options, weights=weights, k=1)[0] if weights else random.choice(options)
+    options, cum_weights = get_cached_options("difficulties.jsonl")
+    return random.choices(options, cum_weights=cum_weights, k=1)[0] if cum_weights else random.choice(options)
 
 def get_topic():
     # Uniformly sample a topic from the list of topics.
-    options, weights = get_cached_options("topics.jsonl")
-    return random.choices(options, weights=weights, k=1)[0] if weights else random.choice(options)
+    options, cum_weights = get_cached_options("topics.jsonl")
+    return random.choices(options, cum_weights=cum_weights, k=1)[0] if cum_weights else random.choice(options)
 
 def get_language():
     # Uniformly sample a language from the list of languages.
-    options, weights = get_cached_options("languages.jsonl")
-    return random.choices(options, weights=weights, k=1)[0] if weights else random.choice(options)
+    options, cum_weights = get_cached_options("languages.jsonl")
+    return random.choices(options, cum_weights=cum_weights, k=1)[0] if cum_weights else random.choice(options)
 
 def set_is_grounded():
     # Randomly sample whether the question is grounded or not.
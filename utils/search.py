@@ -2,42 +2,66 @@ from collections import defaultdict
 from tqdm import tqdm
 import re
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from azure.search.documents import SearchClient
+from utils.vectors import normalize_embeddings
+
+# Page number suffix of a chunk_id, e.g. "..._pages_12"
+PAGE_NUMBER_PATTERN = re.compile(r'pages_(\d+)$')
 
 
 def get_all_chunks(index, credential, search_endpoint, k=100000):
+    """
+    Retrieve chunks from the search index.
+    
+    Returns a tuple (chunks, embeddings):
+      - chunks: List of dicts with 'chunk_id', 'title' and 'chunk'
+      - embeddings: L2-normalized float32 matrix of shape (len(chunks), d), where
+        row i is the embedding of chunks[i]
+    """
     try:
         search_client = SearchClient(
             endpoint=search_endpoint,
             index_name=index,
-            credential=credential,
-            include_total_count=True
+            credential=credential
         )
         
         results = search_client.search(
             search_text="*",
-            top=k
+            top=k,
+            include_total_count=True
         )
         data = []
+        embeddings = None
+
+        # The total count lets us preallocate the embedding matrix and fill it
+        # row by row as pages stream in
+        total_count = min(results.get_count() or 0, k)
 
         pages = results.by_page()
         for page in pages:
-            results = list(page)
-            for result in results:
+            for result in page:
+                vector = result["text_vector"]
+                if embeddings is None:
+                    embeddings = np.empty((max(total_count, 1), len(vector)), dtype=np.float32)
+                elif len(data) == len(embeddings):
+                    # More results than counted (e.g. documents added meanwhile): grow the matrix
+                    embeddings = np.concatenate([embeddings, np.empty_like(embeddings)])
+                embeddings[len(data)] = vector
                 data.append(
                     {
                         "chunk_id": result["chunk_id"], # change to id
                         "title": result["title"],
-                        "chunk": result["chunk"],
-                        "chunk_embedding": result["text_vector"]
+                        "chunk": result["chunk"]
                     }
                 )
-            return data
+
+        if embeddings is None:
+            return data, np.empty((0, 0), dtype=np.float32)
+        return data, normalize_embeddings(embeddings[:len(data)], copy=False)
     except Exception as e:
         print(e)
-        return None
+        return None, None
 
 
 def get_chunk(index, chunk_id, search_endpoint, credential, fields=None):
@@ -64,7 +88,7 @@ def extract_page_number(chunk_id):
     Pattern: ...pages_{number}
     Returns: int (page number) or 0 if not found
     """
-    match = re.search(r'pages_(\d+)$', chunk_id)
+    match = PAGE_NUMBER_PATTERN.search(chunk_id)
     if match:
         return int(match.group(1))
     return 0  # Default to 0 if no page number found
@@ -105,37 +129,104 @@ def build_document_map(chunks, extract_pn=False):
     return doc_map
 
 
-def find_similar_chunks(main_chunk, all_chunks, k=5):
+def build_chunk_index(chunks):
+    """
+    Map each chunk_id to the list of its row positions in chunks.
+    
+    Build it once and pass it to find_similar_chunks when calling repeatedly, so the
+    main chunk's row is a dict lookup instead of a scan over all chunks.
+    """
+    chunk_index = defaultdict(list)
+    for row, chunk in enumerate(chunks):
+        chunk_index[chunk['chunk_id']].append(row)
+    return dict(chunk_index)
+
+
+def find_similar_chunks(main_chunk, all_chunks, embeddings, k=5, chunk_index=None):
     """
     Find k most similar chunks to the main chunk using cosine similarity.
     
     Args:
-        main_chunk: Dict with 'chunk_id' and 'chunk_embedding' keys
-        all_chunks: List of dicts, each with 'chunk_id', 'chunk', and 'chunk_embedding'
+        main_chunk: Dict with 'chunk_id', one of all_chunks
+        all_chunks: List of dicts, each with 'chunk_id' and 'chunk'
+        embeddings: L2-normalized matrix where row i is the embedding of all_chunks[i]
+            (as returned by get_all_chunks, or built with normalize_embeddings)
         k: Number of similar chunks to return (default 5)
+        chunk_index: Optional precomputed map from build_chunk_index(all_chunks)
         
     Returns:
         List of k most similar chunks (excluding the main chunk itself)
+    
+    Raises:
+        ValueError: If main_chunk's chunk_id is not in all_chunks
     """
     main_chunk_id = main_chunk['chunk_id']
-    main_embedding = np.array(main_chunk['chunk_embedding']).reshape(1, -1)
     
-    # Prepare all embeddings and filter out the main chunk
-    other_chunks = [c for c in all_chunks if c['chunk_id'] != main_chunk_id]
+    if chunk_index is None:
+        chunk_index = build_chunk_index(all_chunks)
+    main_rows = chunk_index.get(main_chunk_id)
+    if not main_rows:
+        raise ValueError(f"Main chunk '{main_chunk_id}' is not in all_chunks")
     
-    if len(other_chunks) == 0:
+    k = min(k, len(all_chunks) - len(main_rows))
+    if k <= 0:
         return []
     
-    # Stack embeddings for vectorized computation
-    other_embeddings = np.vstack([np.array(c['chunk_embedding']) for c in other_chunks])
-    
-    # Compute cosine similarities
-    similarities = cosine_similarity(main_embedding, other_embeddings)[0]
+    # Cosine similarities (embeddings are already normalized); rows of the main
+    # chunk are excluded from the candidates
+    similarities = embeddings @ embeddings[main_rows[0]]
+    similarities[main_rows] = -np.inf
     
-    # Get indices of top-k most similar chunks
-    top_k_indices = np.argsort(similarities)[::-1][:k]
+    # Get indices of top-k most similar chunks: partial selection in O(N),
+    # then sort only the k selected entries
+    if k < len(similarities):
+        top_k_indices = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        top_k_indices = np.arange(len(similarities))
+    top_k_indices = top_k_indices[np.argsort(-similarities[top_k_indices])]
     
     # Return the top-k similar chunks
-    similar_chunks = [other_chunks[i] for i in top_k_indices]
+    similar_chunks = [all_chunks[i] for i in top_k_indices]
+    
+    return similar_chunks
+
+
+def find_all_similar_chunks(chunks, embeddings, k=5, block_size=1024):
+    """
+    Find the k most similar chunks for every chunk in a single batched pass.
+    
+    Similarities are computed block-wise as (block_size x N) matrix products, keeping
+    memory bounded for large N. Each chunk is excluded from its own neighbors by position,
+    so chunk_ids are assumed to be unique; under that assumption the result matches calling
+    find_similar_chunks(chunk, chunks, embeddings, k) for each chunk, which excludes every
+    chunk sharing the main chunk's chunk_id.
+    
+    Args:
+        chunks: List of dicts, each with 'chunk_id' and 'chunk'
+        embeddings: L2-normalized matrix where row i is the embedding of chunks[i]
+        k: Number of similar chunks to return per chunk (default 5)
+        block_size: Number of rows of the similarity matrix computed at once
+        
+    Returns:
+        List where element i holds the k most similar chunks to chunks[i] (excluding itself)
+    """
+    n = len(chunks)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    
+    neighbors = []
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        similarities = embeddings[start:end] @ embeddings.T
+        # Exclude each chunk from its own neighbors
+        similarities[np.arange(end - start), np.arange(start, end)] = -np.inf
+        
+        # Partial top-k per row, then order only those k by similarity
+        top_k = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_k_sims = np.take_along_axis(similarities, top_k, axis=1)
+        top_k = np.take_along_axis(top_k, np.argsort(-top_k_sims, axis=1), axis=1)
+        
+        neighbors.extend([chunks[j] for j in row] for row in top_k)
     
-    return similar_chunks
\ No newline at end of file
+    return neighbors
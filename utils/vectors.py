@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def normalize_embeddings(embeddings, copy: bool = True) -> np.ndarray:
+    """
+    Converts embeddings to a contiguous float32 matrix with L2-normalized rows.
+
+    With normalized rows, cosine similarity is a plain matrix product (X @ Y.T),
+    so callers can normalize once and reuse the matrix for repeated lookups.
+    With copy=False, an input that already is a contiguous float32 array is
+    normalized in place instead of copied.
+    """
+    X = np.atleast_2d(np.asarray(embeddings, dtype=np.float32, order="C"))
+    if copy and isinstance(embeddings, np.ndarray) and np.shares_memory(X, embeddings):
+        X = X.copy()
+    X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+    return X